@@ -1,131 +1,334 @@
 import os
-import glob
+import sys
+import atexit
+import json
+import select
+import signal
 import subprocess
+import threading
 import time
 import shutil
 import tempfile
 from py4j.java_gateway import JavaGateway, GatewayParameters
 
+# Printed by Py4JEntryPoint once the GatewayServer is accepting connections
+GATEWAY_READY_LINE = b"Py4J Gateway Server Started"
+GATEWAY_ADDRESS = "127.0.0.1"
+GATEWAY_START_TIMEOUT = 30
+
+
+def _pump_gateway_output(stream, ready, gateway_info):
+    """Forwards the JVM's stdout and signals once the gateway is ready.
+
+    The port the gateway listens on ("... Started on port <n>") is stored in
+    gateway_info["port"]; it is left unset if the line carries no valid port.
+    The pipe must keep being drained for the lifetime of the process,
+    otherwise the JVM blocks as soon as the pipe buffer fills up.
+    """
+    for line in iter(stream.readline, b""):
+        if not ready.is_set() and line.startswith(GATEWAY_READY_LINE):
+            port = line[len(GATEWAY_READY_LINE):].split()[-1:]
+            if port and port[0].isdigit() and int(port[0]) > 0:
+                gateway_info["port"] = int(port[0])
+            ready.set()
+        try:
+            sys.__stdout__.write(line.decode(errors="replace"))
+            sys.__stdout__.flush()
+        except (AttributeError, ValueError, OSError):
+            pass
+    # EOF - the process exited, wake up anyone still waiting
+    ready.set()
+    stream.close()
+
+
+def _wait_for_exit(process, timeout):
+    """Waits up to timeout seconds for process to exit, returns True if it did.
+
+    Uses a pidfd on Linux so the wait sleeps until the exit event instead of
+    going through subprocess' polling loop, falling back to wait() elsewhere.
+    """
+    try:
+        fd = os.pidfd_open(process.pid)
+    except (AttributeError, OSError):
+        try:
+            process.wait(timeout=timeout)
+            return True
+        except subprocess.TimeoutExpired:
+            return False
+
+    # poll() rather than select(), which can't handle fds >= FD_SETSIZE
+    try:
+        poller = select.poll()
+        poller.register(fd, select.POLLIN)
+        ready = poller.poll(timeout * 1000)
+    finally:
+        os.close(fd)
+    if not ready:
+        return False
+    # Reap the child
+    process.wait()
+    return True
+
+
+def _write_bytes(path, data):
+    """Writes data to path with raw os calls, skipping the io buffering layer."""
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0), 0o644)
+    try:
+        view = memoryview(data)
+        while view:
+            view = view[os.write(fd, view):]
+    finally:
+        os.close(fd)
+
+
+def _list_jars(lib_dir):
+    """Returns the JAR files in lib_dir, or an empty list if it doesn't exist."""
+    try:
+        with os.scandir(lib_dir) as entries:
+            return [entry.path for entry in entries
+                    if entry.name.endswith(".jar") and entry.is_file()]
+    except OSError:
+        return []
+
+
+def _find_classpath(install_dir=None):
+    # Determine where JARs are located
+    # 1. Check if provided explicitly
+    # 2. Check inside the package (installed mode)
+    # 3. Check in build directory (dev mode)
+
+    jars = []
+    if install_dir:
+        jars = _list_jars(os.path.join(install_dir, "lib"))
+
+    if not jars:
+        # Check package directory (e.g. site-packages/corewars8086_lib/lib)
+        jars = _list_jars(os.path.join(os.path.dirname(__file__), "lib"))
+
+    if not jars:
+        # Check build directory (dev mode fallback)
+        jars = _list_jars(os.path.join("build", "install", "corewars8086", "lib"))
+
+    if not jars:
+        raise RuntimeError(f"No JARs found. Provide install_dir or ensure package is installed correctly.")
+
+    # Absolute paths so the classpath doesn't depend on the working dir
+    return os.pathsep.join(os.path.abspath(jar) for jar in jars)
+
+
+def _start_jvm(classpath):
+    """Starts the gateway JVM and connects to it, returns (process, gateway)."""
+    java_cmd = "java"
+    # Prefer JAVA_HOME
+    java_home = os.environ.get("JAVA_HOME")
+    if java_home and os.path.exists(os.path.join(java_home, "bin", "java.exe")):
+         java_cmd = os.path.join(java_home, "bin", "java.exe")
+    elif shutil.which("java"):
+         java_cmd = "java"
+    else:
+         raise RuntimeError("Java executable not found in PATH or JAVA_HOME")
+
+    # Start Java process
+    cmd = [java_cmd, "-cp", classpath, "il.co.codeguru.corewars8086.Py4JEntryPoint"]
+    # stdout is piped so we can tell when the gateway is listening; it is
+    # still forwarded to our stdout since it's useful for debugging
+    # Run it in its own process group so shutdown reaches anything it spawns
+    if os.name == "nt":
+        process = subprocess.Popen(cmd, stdout=subprocess.PIPE,
+                                   creationflags=subprocess.CREATE_NEW_PROCESS_GROUP)
+    else:
+        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, start_new_session=True)
+
+    ready = threading.Event()
+    gateway_info = {}
+    pump = threading.Thread(
+        target=_pump_gateway_output, args=(process.stdout, ready, gateway_info), daemon=True)
+    pump.start()
+
+    # Block until the JVM reports the gateway is up instead of polling it
+    if not ready.wait(GATEWAY_START_TIMEOUT):
+        _stop_jvm(process, None)
+        raise RuntimeError("Py4J Gateway did not start within "
+                           f"{GATEWAY_START_TIMEOUT} seconds")
+    if "port" not in gateway_info:
+        # The pump hit EOF without seeing the readiness line; give the
+        # process a moment to finish exiting so we can report its status
+        _wait_for_exit(process, 1)
+    if process.poll() is not None:
+        returncode = process.returncode
+        _stop_jvm(process, None)
+        raise RuntimeError("Java process exited with code "
+                           f"{returncode} before the Py4J Gateway started; "
+                           "check the classpath and the Java output above")
+    if "port" not in gateway_info:
+        _stop_jvm(process, None)
+        raise RuntimeError("Py4J Gateway did not report a valid listening port")
+
+    try:
+        gateway = JavaGateway(gateway_parameters=GatewayParameters(
+            address=GATEWAY_ADDRESS, port=gateway_info["port"], auto_convert=True))
+        # Test connection
+        gateway.jvm.java.lang.System.currentTimeMillis()
+    except Exception as e:
+        _stop_jvm(process, None)
+        raise RuntimeError(f"Failed to connect to Py4J Gateway: {e}")
+
+    return process, gateway
+
+
+def _stop_jvm(process, gateway):
+    if gateway:
+        gateway.shutdown()
+    if process.returncode is not None:
+        # Already reaped, so the pid may belong to an unrelated process by now
+        return
+    _signal_process_group(process, signal.SIGTERM)
+    if not _wait_for_exit(process, 5):
+        _signal_process_group(process, getattr(signal, "SIGKILL", signal.SIGTERM))
+        process.wait()
+
+
+def _signal_process_group(process, sig):
+    if os.name == "nt":
+        # CTRL_BREAK_EVENT only makes the JVM dump its threads, and
+        # terminate() already ends it unconditionally on Windows
+        process.terminate()
+        return
+    try:
+        os.killpg(process.pid, sig)
+    except ProcessLookupError:
+        pass
+
+
+# A single gateway JVM is shared by all engines in the process and torn down
+# when the last one is closed. Engines only share the JVM; each keeps its own
+# Competition object. The generation is bumped whenever a new JVM is started,
+# so engines still holding a JVM that died don't release its replacement.
+_JVM_LOCK = threading.Lock()
+_SHARED_JVM = {"classpath": None, "process": None, "gateway": None, "refs": 0,
+               "generation": 0}
+# Releases that couldn't take _JVM_LOCK (see CoreWarsEngine.__del__); they are
+# applied by the next caller that holds the lock
+_DEFERRED_RELEASES = []
+
+
+def _acquire_jvm(install_dir=None):
+    """Returns (gateway, generation), starting the JVM if none is running."""
+    with _JVM_LOCK:
+        _apply_deferred_releases()
+        process = _SHARED_JVM["process"]
+        if process is not None and process.poll() is not None:
+            # The JVM died (e.g. OOM or System.exit); start a fresh one. Engines
+            # holding the dead gateway are left with a stale generation.
+            _shutdown_jvm()
+
+        if _SHARED_JVM["refs"] == 0:
+            classpath = _find_classpath(install_dir)
+            process, gateway = _start_jvm(classpath)
+            _SHARED_JVM.update(classpath=classpath, process=process, gateway=gateway,
+                               generation=_SHARED_JVM["generation"] + 1)
+        elif install_dir and _find_classpath(install_dir) != _SHARED_JVM["classpath"]:
+            raise RuntimeError("A CoreWars JVM with a different classpath is already "
+                               "running. Close existing engines first.")
+        _SHARED_JVM["refs"] += 1
+        return _SHARED_JVM["gateway"], _SHARED_JVM["generation"]
+
+
+def _release_jvm(generation, blocking=True):
+    """Drops one reference to the shared JVM, stopping it on the last one.
+
+    With blocking=False the release is deferred instead of waiting when the
+    lock is held, e.g. when the GC finalizes an engine on a thread that is
+    in the middle of _acquire_jvm.
+    """
+    if not _JVM_LOCK.acquire(blocking):
+        _DEFERRED_RELEASES.append(generation)
+        return
+    try:
+        _apply_deferred_releases()
+        _release_locked(generation)
+    finally:
+        _JVM_LOCK.release()
+
+
+def _apply_deferred_releases():
+    while _DEFERRED_RELEASES:
+        _release_locked(_DEFERRED_RELEASES.pop())
+
+
+def _release_locked(generation):
+    if _SHARED_JVM["refs"] == 0 or generation != _SHARED_JVM["generation"]:
+        return
+    _SHARED_JVM["refs"] -= 1
+    if _SHARED_JVM["refs"] == 0:
+        _shutdown_jvm()
+
+
+def _shutdown_jvm():
+    try:
+        if _SHARED_JVM["process"]:
+            _stop_jvm(_SHARED_JVM["process"], _SHARED_JVM["gateway"])
+    finally:
+        _SHARED_JVM.update(classpath=None, process=None, gateway=None, refs=0)
+
+
+atexit.register(_shutdown_jvm)
+
+
 class CoreWarsEngine:
     def __init__(self, install_dir=None):
-        self.process = None
         self.gateway = None
         self.competition = None
-        self._managed_dir = tempfile.mkdtemp()
-        
-        # Determine where JARs are located
-        # 1. Check if provided explicitly
-        # 2. Check inside the package (installed mode)
-        # 3. Check in build directory (dev mode)
-        
-        jars = []
-        if install_dir:
-             lib_dir = os.path.join(install_dir, "lib")
-             jars = glob.glob(os.path.join(lib_dir, "*.jar"))
-        
-        if not jars:
-            # Check package directory (e.g. site-packages/corewars8086_lib/lib)
-            pkg_dir = os.path.dirname(__file__)
-            pkg_lib_dir = os.path.join(pkg_dir, "lib")
-            if os.path.exists(pkg_lib_dir):
-                jars = glob.glob(os.path.join(pkg_lib_dir, "*.jar"))
-        
-        if not jars:
-            # Check build directory (dev mode fallback)
-            dev_lib_dir = os.path.join("build", "install", "corewars8086", "lib")
-            if os.path.exists(dev_lib_dir):
-                 jars = glob.glob(os.path.join(dev_lib_dir, "*.jar"))
-                 # Fallback to absolute path if relative fails
-                 if not jars:
-                     abs_lib_dir = os.path.abspath(dev_lib_dir)
-                     jars = glob.glob(os.path.join(abs_lib_dir, "*.jar"))
-
-        if not jars:
-            raise RuntimeError(f"No JARs found. Provide install_dir or ensure package is installed correctly.")
-        
-        classpath = os.pathsep.join(jars)
-        
-        java_cmd = "java"
-        # Prefer JAVA_HOME
-        java_home = os.environ.get("JAVA_HOME")
-        if java_home and os.path.exists(os.path.join(java_home, "bin", "java.exe")):
-             java_cmd = os.path.join(java_home, "bin", "java.exe")
-        elif shutil.which("java"):
-             java_cmd = "java"
-        else:
-             raise RuntimeError("Java executable not found in PATH or JAVA_HOME")
-
-        # Start Java process
-        cmd = [java_cmd, "-cp", classpath, "il.co.codeguru.corewars8086.Py4JEntryPoint"]
-        # We can redirect stdout/stderr if needed, but for debugging it's useful to see
-        self.process = subprocess.Popen(cmd)
-        
-        # Connect to gateway (retry a few times)
-        retries = 20
-        last_error = None
-        for i in range(retries):
-            try:
-                self.gateway = JavaGateway(gateway_parameters=GatewayParameters(auto_convert=True))
-                # Test connection
-                self.gateway.jvm.java.lang.System.currentTimeMillis()
-                last_error = None
-                break
-            except Exception as e:
-                last_error = e
-                time.sleep(0.5)
-        
-        if last_error:
-            self.terminate_process()
-            raise RuntimeError(f"Failed to connect to Py4J Gateway: {last_error}")
+        # Removed by close(), or by its finalizer if close() is never called
+        self._managed_tmp = tempfile.TemporaryDirectory()
+        # Warriors go in a subdir: the Java side treats every file in the
+        # warriors dir as a warrior, so auto-loaded scores live beside it
+        self._managed_dir = os.path.join(self._managed_tmp.name, "warriors")
+        os.mkdir(self._managed_dir)
+        # Set when warriors were added to the managed dir but not loaded yet
+        self._pending_warriors = False
+        self.gateway, self._jvm_generation = _acquire_jvm(install_dir)
 
     def load_warriors(self, warrior_dir, zombies_dir=None, results_file="scores.csv"):
-        Options = self.gateway.jvm.il.co.codeguru.corewars8086.cli.Options
-        OptionsClass = self.gateway.jvm.java.lang.Class.forName("il.co.codeguru.corewars8086.cli.Options")
-        OptionsParser = self.gateway.jvm.com.google.devtools.common.options.OptionsParser
-        Competition = self.gateway.jvm.il.co.codeguru.corewars8086.war.Competition
-        
-        parser = OptionsParser.newOptionsParser(OptionsClass)
-        
-        args = ["--warriorsDir", os.path.abspath(warrior_dir)]
-        if zombies_dir:
-            args.extend(["--zombiesDir", os.path.abspath(zombies_dir)])
-        
-        if results_file:
-            args.extend(["--outputFile", os.path.abspath(results_file)])
-        
-        java_args = self.gateway.new_array(self.gateway.jvm.java.lang.String, len(args))
-        for i, arg in enumerate(args):
-            java_args[i] = arg
-            
-        parser.parseAndExitUponError(java_args)
-        options = parser.getOptions(OptionsClass)
-        
-        try:
-            self.competition = Competition(options)
-        except Exception as e:
-            # Re-raise exception with better message if possible, or just let it propagate
-            raise
-    
+        zombies_dir = os.path.abspath(zombies_dir) if zombies_dir else None
+        results_file = os.path.abspath(results_file) if results_file else None
+
+        # Options are parsed on the Java side so the arguments cross the
+        # gateway as plain strings in a single call
+        self.competition = self.gateway.entry_point.newCompetition(
+            os.path.abspath(warrior_dir), zombies_dir, results_file)
+        self._pending_warriors = False
+
     def add_warrior_from_bytes(self, name, data):
-        path = os.path.join(self._managed_dir, name)
-        with open(path, "wb") as f:
-            f.write(data)
-        
-        # Invalidate current competition so it reloads on next run
-        self.competition = None
+        self.add_warriors_from_bytes([(name, data)])
+
+    def add_warriors_from_bytes(self, warriors):
+        """Adds several (name, data) warriors, invalidating the competition once."""
+        added = False
+        try:
+            for name, data in warriors:
+                _write_bytes(os.path.join(self._managed_dir, name), data)
+                added = True
+        finally:
+            # Invalidate current competition so it reloads on next run, even
+            # if a later write in the batch failed
+            if added:
+                self.competition = None
+                self._pending_warriors = True
 
     def get_warrior_count(self):
         if not self.competition:
             # If competition not loaded but we have managed warriors, count files?
             # Or just return 0. For consistency with Java behavior, 0 is safer until loaded.
             return 0
-        return self.competition.getWarriorRepository().getNumberOfGroups()
+        return self.gateway.entry_point.getWarriorCount(self.competition)
 
     def run_competition(self, battles=100, combination_size=4, parallel=True, threads=4, seed=None):
         if not self.competition:
              # Try to auto-load from managed dir if not explicitly loaded
-             if os.listdir(self._managed_dir):
-                 self.load_warriors(self._managed_dir)
+             if self._pending_warriors:
+                 self.load_warriors(self._managed_dir,
+                                    results_file=os.path.join(self._managed_tmp.name, "scores.csv"))
              else:
                  raise RuntimeError("Warriors not loaded. Call load_warriors() or add_warrior_from_bytes() first.")
              
@@ -160,54 +363,45 @@ class CoreWarsEngine:
         if not self.competition:
             return []
         
-        repo = self.competition.getWarriorRepository()
-        groups = repo.getWarriorGroups()
-        
-        results = []
-        for i in range(groups.size()):
-            group = groups.get(i)
-            group_data = {
-                "name": group.getName(),
-                "score": group.getGroupScore(),
-                "warriors": []
-            }
-            
-            warriors = group.getWarriors()
-            scores = group.getScores()
-            for j in range(warriors.size()):
-                w_data = warriors.get(j)
-                w_score = scores.get(j)
-                group_data["warriors"].append({
-                    "name": w_data.getName(),
-                    "score": w_score
-                })
-            results.append(group_data)
-            
+        # Fetch everything in a single gateway call rather than one round trip
+        # per group/warrior accessor
+        results = json.loads(self.gateway.entry_point.serializeScores(self.competition))
+
         # Sort by score desc
         results.sort(key=lambda x: x["score"], reverse=True)
         return results
 
+    def reset_state(self):
+        """Forgets all loaded and added warriors but keeps the JVM running."""
+        if self.gateway is None:
+            raise RuntimeError("Engine is closed")
+        self.competition = None
+        self._pending_warriors = False
+        with os.scandir(self._managed_dir) as entries:
+            for entry in entries:
+                os.remove(entry.path)
+
     def terminate_process(self):
-        if self.process:
-            self.process.terminate()
-            try:
-                self.process.wait(timeout=5)
-            except subprocess.TimeoutExpired:
-                self.process.kill()
-            self.process = None
-        
-        # Cleanup managed dir
-        if self._managed_dir and os.path.exists(self._managed_dir):
-            try:
-                shutil.rmtree(self._managed_dir)
-            except OSError:
-                pass
+        # The JVM itself is only stopped once the last engine releases it
+        self._release_gateway()
 
-    def close(self):
+        # Cleanup managed dir (a no-op once it has been removed)
+        try:
+            self._managed_tmp.cleanup()
+        except OSError:
+            pass
+
+    def _release_gateway(self, blocking=True):
         if self.gateway:
-            self.gateway.shutdown()
             self.gateway = None
+            self.competition = None
+            _release_jvm(self._jvm_generation, blocking)
+
+    def close(self):
         self.terminate_process()
         
     def __del__(self):
+        # The GC may run this on a thread already holding the JVM lock, so
+        # never wait for it here
+        self._release_gateway(blocking=False)
         self.close()
@@ -1,5 +1,6 @@
 import setuptools
 import os
+import hashlib
 import subprocess
 import shutil
 from setuptools.command.build_py import build_py
@@ -8,8 +9,46 @@ from setuptools.command.sdist import sdist
 # Get the current directory
 HERE = os.path.abspath(os.path.dirname(__file__))
 
+# Inputs of the Gradle build; the JARs are only rebuilt when these change
+JAVA_BUILD_INPUTS = ["src/main/java", "build.gradle", "settings.gradle", "pom.xml"]
+JAR_CACHE_FILE = os.path.join(HERE, "build", ".jar_cache_sha")
+
+def java_sources_hash():
+    """Returns a SHA-256 over the paths and contents of the Java build inputs."""
+    files = []
+    for entry in JAVA_BUILD_INPUTS:
+        path = os.path.join(HERE, entry)
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                files.extend(os.path.join(root, name) for name in names)
+        elif os.path.isfile(path):
+            files.append(path)
+
+    sha = hashlib.sha256()
+    for path in sorted(files):
+        sha.update(os.path.relpath(path, HERE).replace(os.sep, "/").encode())
+        with open(path, "rb") as f:
+            sha.update(hashlib.sha256(f.read()).digest())
+    return sha.hexdigest()
+
+def jars_up_to_date(dest_lib_dir, sources_hash):
+    if not os.path.exists(JAR_CACHE_FILE) or not os.path.isdir(dest_lib_dir):
+        return False
+    if not any(f.endswith(".jar") for f in os.listdir(dest_lib_dir)):
+        return False
+    with open(JAR_CACHE_FILE, "r") as f:
+        return f.read().strip() == sources_hash
+
 def build_jars():
     """Runs Gradle to build the JARs and copies them to the package directory."""
+    src_lib_dir = os.path.join(HERE, "build", "install", "corewars8086", "lib")
+    dest_lib_dir = os.path.join(HERE, "corewars8086_lib", "lib")
+
+    sources_hash = java_sources_hash()
+    if jars_up_to_date(dest_lib_dir, sources_hash):
+        print("Java sources unchanged since the last build, skipping Gradle.")
+        return
+
     print("Running Gradle build...")
     if os.name == 'nt':
         gradle_cmd = "gradle" 
@@ -20,24 +59,35 @@ def build_jars():
     else:
         gradle_cmd = "./gradlew" if os.path.exists("./gradlew") else "gradle"
     
+    built = False
     try:
         subprocess.check_call([gradle_cmd, "installDist"], cwd=HERE)
+        built = True
     except (subprocess.CalledProcessError, FileNotFoundError):
         print("Gradle build failed or gradle not found. Assuming JARs are already built or this is an install from sdist without gradle.")
 
     # Copy JARs
-    src_lib_dir = os.path.join(HERE, "build", "install", "corewars8086", "lib")
-    dest_lib_dir = os.path.join(HERE, "corewars8086_lib", "lib")
-    
     if os.path.exists(src_lib_dir):
-        if os.path.exists(dest_lib_dir):
-            shutil.rmtree(dest_lib_dir)
-        os.makedirs(dest_lib_dir)
-        
+        # Copy into a staging dir and swap it in, so an interrupted copy never
+        # leaves a half-populated lib dir behind
+        staging_dir = dest_lib_dir + ".tmp"
+        if os.path.exists(staging_dir):
+            shutil.rmtree(staging_dir)
+        os.makedirs(staging_dir)
+
         for f in os.listdir(src_lib_dir):
             if f.endswith(".jar"):
-                shutil.copy2(os.path.join(src_lib_dir, f), os.path.join(dest_lib_dir, f))
+                shutil.copy2(os.path.join(src_lib_dir, f), os.path.join(staging_dir, f))
+
+        if os.path.exists(dest_lib_dir):
+            shutil.rmtree(dest_lib_dir)
+        os.replace(staging_dir, dest_lib_dir)
         print(f"Copied JARs to {dest_lib_dir}")
+
+        # Only remember the hash for JARs Gradle actually built from these sources
+        if built:
+            with open(JAR_CACHE_FILE, "w") as f:
+                f.write(sources_hash)
     else:
         print(f"Warning: Source JAR directory {src_lib_dir} not found. If this is a source install, ensure JARs are present.")
 
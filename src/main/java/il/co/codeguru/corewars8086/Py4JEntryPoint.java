@@ -1,12 +1,121 @@
 package il.co.codeguru.corewars8086;
 
+import com.google.devtools.common.options.OptionsParser;
+import il.co.codeguru.corewars8086.cli.Options;
+import il.co.codeguru.corewars8086.war.Competition;
+import il.co.codeguru.corewars8086.war.WarriorData;
+import il.co.codeguru.corewars8086.war.WarriorGroup;
 import py4j.GatewayServer;
 
+import java.io.IOException;
+import java.net.InetAddress;
+import java.net.UnknownHostException;
+import java.util.ArrayList;
+import java.util.List;
+
+/**
+ * Entry point exposed to the Python wrapper through Py4J.
+ *
+ * Every call made from Python is a socket round trip, so accessors here
+ * return the whole result in one go rather than handing out Java objects
+ * to be walked field by field.
+ */
 public class Py4JEntryPoint {
-    public static void main(String[] args) {
-        GatewayServer server = new GatewayServer(null);
+
+    /**
+     * Parses the command line options and loads a competition in one call,
+     * so the arguments don't have to be copied into a Java array one
+     * element (and one round trip) at a time.
+     *
+     * @param warriorsDir Directory holding the warriors.
+     * @param zombiesDir  Directory holding the zombies, or null.
+     * @param outputFile  File to write the scores to, or null for the default.
+     */
+    public Competition newCompetition(String warriorsDir, String zombiesDir, String outputFile)
+            throws IOException {
+        List<String> args = new ArrayList<>();
+        args.add("--warriorsDir");
+        args.add(warriorsDir);
+        if (zombiesDir != null) {
+            args.add("--zombiesDir");
+            args.add(zombiesDir);
+        }
+        if (outputFile != null) {
+            args.add("--outputFile");
+            args.add(outputFile);
+        }
+
+        OptionsParser parser = OptionsParser.newOptionsParser(Options.class);
+        parser.parseAndExitUponError(args.toArray(new String[0]));
+        return new Competition(parser.getOptions(Options.class));
+    }
+
+    /**
+     * @param competition Competition to read the results of.
+     * @return a JSON array of {name, score, warriors: [{name, score}]}, one
+     * entry per warrior group, in repository order.
+     */
+    public String serializeScores(Competition competition) {
+        StringBuilder sb = new StringBuilder("[");
+        List<WarriorGroup> groups = competition.getWarriorRepository().getWarriorGroups();
+        for (int i = 0; i < groups.size(); i++) {
+            WarriorGroup group = groups.get(i);
+            if (i > 0) {
+                sb.append(',');
+            }
+            sb.append("{\"name\":");
+            appendJsonString(sb, group.getName());
+            sb.append(",\"score\":").append(group.getGroupScore());
+            sb.append(",\"warriors\":[");
+
+            List<WarriorData> warriors = group.getWarriors();
+            List<Float> scores = group.getScores();
+            for (int j = 0; j < warriors.size(); j++) {
+                if (j > 0) {
+                    sb.append(',');
+                }
+                sb.append("{\"name\":");
+                appendJsonString(sb, warriors.get(j).getName());
+                sb.append(",\"score\":").append(scores.get(j)).append('}');
+            }
+            sb.append("]}");
+        }
+        return sb.append(']').toString();
+    }
+
+    /** @return the number of warrior groups loaded in the competition. */
+    public int getWarriorCount(Competition competition) {
+        return competition.getWarriorRepository().getNumberOfGroups();
+    }
+
+    private static void appendJsonString(StringBuilder sb, String value) {
+        sb.append('"');
+        for (int i = 0; i < value.length(); i++) {
+            char c = value.charAt(i);
+            if (c == '"' || c == '\\') {
+                sb.append('\\').append(c);
+            } else if (c < 0x20) {
+                sb.append(String.format("\\u%04x", (int) c));
+            } else {
+                sb.append(c);
+            }
+        }
+        sb.append('"');
+    }
+
+    public static void main(String[] args) throws UnknownHostException {
+        // Bind explicitly to IPv4 loopback so the Python side never races an
+        // IPv6 "localhost" resolution on its first handshake. Port 0 lets the
+        // OS pick a free port, so several JVMs (e.g. one per test worker)
+        // can run side by side.
+        GatewayServer server = new GatewayServer.GatewayServerBuilder()
+                .entryPoint(new Py4JEntryPoint())
+                .javaAddress(InetAddress.getByName("127.0.0.1"))
+                .javaPort(0)
+                .build();
         server.start();
-        System.out.println("Py4J Gateway Server Started");
+        // The Python wrapper waits for this line and reads the port from it
+        System.out.println("Py4J Gateway Server Started on port " + server.getListeningPort());
+        System.out.flush();
     }
 }
-
@@ -15,7 +15,6 @@ public class Competition {
 
     /** Maximum number of rounds in a single war. */
     public final static int MAX_ROUND = 200000;
-    private static final String SCORE_FILENAME= "scores.csv";
 
     private CompetitionIterator competitionIterator;
 
@@ -73,7 +72,7 @@ public class Competition {
 			      }
         }
         competitionEventListener.onCompetitionEnd();
-        warriorRepository.saveScoresToFile(SCORE_FILENAME);
+        warriorRepository.saveScoresToFile(options.outputFile);
     }
     
     public void runCompetitionInParallel(int warsPerCombination, int warriorsPerGroup, int threads) throws InterruptedException {
@@ -3,19 +3,33 @@ import os
 import time
 import tempfile
 import shutil
-from corewars8086_lib.engine import CoreWarsEngine
+import subprocess
+import sys
+import resource
+from unittest import mock
+from corewars8086_lib import engine as engine_module
+from corewars8086_lib.engine import CoreWarsEngine, _wait_for_exit
 
 class TestCoreWarsEngine(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # One engine (and JVM) for the whole class; setUp only resets it
+        cls.engine = CoreWarsEngine()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.engine.close()
+
     def setUp(self):
-        self.engine = CoreWarsEngine()
+        self.engine.reset_state()
         self.test_dir = tempfile.mkdtemp()
         self.warriors_dir = os.path.join(self.test_dir, "warriors")
         self.zombies_dir = os.path.join(self.test_dir, "zombies")
+        self.results_file = os.path.join(self.test_dir, "scores.csv")
         os.makedirs(self.warriors_dir)
         os.makedirs(self.zombies_dir)
 
     def tearDown(self):
-        self.engine.close()
         try:
             shutil.rmtree(self.test_dir)
         except OSError:
@@ -28,7 +42,7 @@ class TestCoreWarsEngine(unittest.TestCase):
         warrior_path = os.path.join(self.warriors_dir, "TestWarrior")
         with open(warrior_path, "wb") as f:
             f.write(b"\x90" * 10) 
-        self.engine.load_warriors(self.warriors_dir, self.zombies_dir)
+        self.engine.load_warriors(self.warriors_dir, self.zombies_dir, results_file=self.results_file)
         count = self.engine.get_warrior_count()
         self.assertEqual(count, 1)
 
@@ -39,7 +53,7 @@ class TestCoreWarsEngine(unittest.TestCase):
             with open(path, "wb") as f:
                 f.write(b"\xEB\xFE")
 
-        self.engine.load_warriors(self.warriors_dir, self.zombies_dir)
+        self.engine.load_warriors(self.warriors_dir, self.zombies_dir, results_file=self.results_file)
         self.assertEqual(self.engine.get_warrior_count(), 2)
         
         self.engine.run_competition(battles=1, combination_size=2, parallel=False)
@@ -57,7 +71,7 @@ class TestCoreWarsEngine(unittest.TestCase):
         self.engine.add_warrior_from_bytes("ByteBotB", b"\x90\xEB\xFE")
         
         # Explicitly load loaded warriors to verify file creation
-        self.engine.load_warriors(self.engine._managed_dir)
+        self.engine.load_warriors(self.engine._managed_dir, results_file=self.results_file)
         self.assertEqual(self.engine.get_warrior_count(), 2)
 
         # Should run without explicit load_warriors call if we use the managed dir logic                                                                            
@@ -68,5 +82,123 @@ class TestCoreWarsEngine(unittest.TestCase):
         names = sorted([s["name"] for s in scores])
         self.assertEqual(names, ["ByteBotA", "ByteBotB"])
 
+    def test_add_warriors_from_bytes(self):
+        # An empty batch changes nothing: still nothing to run
+        self.engine.add_warriors_from_bytes([])
+        with self.assertRaises(RuntimeError):
+            self.engine.run_competition(battles=1, combination_size=2, parallel=False)
+
+        self.engine.add_warriors_from_bytes([
+            ("BatchBotA", b"\x90\xEB\xFE"),
+            ("BatchBotB", b"\x90\xEB\xFE"),
+            ("BatchBotC", b"\x90\xEB\xFE"),
+        ])
+
+        # Loaded automatically from the managed dir on first run
+        self.engine.run_competition(battles=1, combination_size=2, parallel=False)
+        self.assertEqual(self.engine.get_warrior_count(), 3)
+
+        names = sorted([s["name"] for s in self.engine.get_scores()])
+        self.assertEqual(names, ["BatchBotA", "BatchBotB", "BatchBotC"])
+
+        # ...and it doesn't drop an already loaded competition
+        self.engine.add_warriors_from_bytes([])
+        self.assertEqual(self.engine.get_warrior_count(), 3)
+
+        # A batch that fails partway still picks up what was written
+        with self.assertRaises(OSError):
+            self.engine.add_warriors_from_bytes([
+                ("BatchBotD", b"\x90\xEB\xFE"),
+                ("missing/BatchBotE", b"\x90\xEB\xFE"),
+            ])
+        self.engine.run_competition(battles=1, combination_size=2, parallel=False)
+        self.assertEqual(self.engine.get_warrior_count(), 4)
+
+    def test_reset_state(self):
+        self.engine.add_warrior_from_bytes("ByteBot", b"\x90\xEB\xFE")
+        self.engine.load_warriors(self.engine._managed_dir, results_file=self.results_file)
+        self.assertEqual(self.engine.get_warrior_count(), 1)
+
+        self.engine.reset_state()
+        self.assertEqual(self.engine.get_warrior_count(), 0)
+        self.assertEqual(os.listdir(self.engine._managed_dir), [])
+        with self.assertRaises(RuntimeError):
+            self.engine.run_competition(battles=1, combination_size=1, parallel=False)
+
+    def test_reset_state_after_close(self):
+        other = CoreWarsEngine()
+        other.close()
+        with self.assertRaisesRegex(RuntimeError, "closed"):
+            other.reset_state()
+
+    def test_engines_share_jvm(self):
+        other = CoreWarsEngine()
+        try:
+            self.assertIs(other.gateway, self.engine.gateway)
+        finally:
+            other.close()
+
+        # Closing one engine must not take the JVM down for the others
+        warrior_path = os.path.join(self.warriors_dir, "TestWarrior")
+        with open(warrior_path, "wb") as f:
+            f.write(b"\xEB\xFE")
+        self.engine.load_warriors(self.warriors_dir, self.zombies_dir, results_file=self.results_file)
+        self.assertEqual(self.engine.get_warrior_count(), 1)
+
+class TestJvmRestart(unittest.TestCase):
+    def test_new_engine_after_jvm_died(self):
+        stale = CoreWarsEngine()
+        process = engine_module._SHARED_JVM["process"]
+        process.kill()
+        process.wait()
+
+        engine = CoreWarsEngine()
+        try:
+            self.assertIsNot(engine.gateway, stale.gateway)
+            # Closing an engine of the dead JVM must not stop the new one
+            stale.close()
+            engine.add_warrior_from_bytes("ByteBot", b"\x90\xEB\xFE")
+            engine.load_warriors(engine._managed_dir,
+                                 results_file=os.path.join(engine._managed_tmp.name, "scores.csv"))
+            self.assertEqual(engine.get_warrior_count(), 1)
+        finally:
+            stale.close()
+            engine.close()
+
+class TestWaitForExit(unittest.TestCase):
+    @unittest.skipUnless(hasattr(os, "pidfd_open"), "needs pidfd_open")
+    def test_high_numbered_pidfd(self):
+        # Move every pidfd onto one fd past select()'s FD_SETSIZE limit rather
+        # than exhausting the fd table to get there
+        high_fd = 1100
+        if resource.getrlimit(resource.RLIMIT_NOFILE)[0] <= high_fd:
+            self.skipTest("fd limit too low")
+        try:
+            os.fstat(high_fd)
+            self.skipTest(f"fd {high_fd} is already in use")
+        except OSError:
+            pass
+
+        real_pidfd_open = os.pidfd_open
+
+        def high_pidfd_open(pid, flags=0):
+            fd = real_pidfd_open(pid, flags)
+            try:
+                return os.dup2(fd, high_fd)
+            finally:
+                os.close(fd)
+
+        process = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(30)"])
+        try:
+            with mock.patch("os.pidfd_open", high_pidfd_open):
+                self.assertFalse(_wait_for_exit(process, 0.1))
+                process.terminate()
+                self.assertTrue(_wait_for_exit(process, 5))
+            self.assertIsNotNone(process.returncode)
+        finally:
+            if process.returncode is None:
+                process.kill()
+                process.wait()
+
 if __name__ == '__main__':
     unittest.main()
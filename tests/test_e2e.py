@@ -6,8 +6,17 @@ import time
 from corewars8086_lib.engine import CoreWarsEngine
 
 class CoreWarsE2ETest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # One engine (and JVM) for the whole class; setUp only resets it
+        cls.engine = CoreWarsEngine()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.engine.close()
+
     def setUp(self):
-        self.engine = CoreWarsEngine()
+        self.engine.reset_state()
         self.work_dir = tempfile.mkdtemp()
         self.warriors_dir = os.path.join(self.work_dir, "warriors")
         self.zombies_dir = os.path.join(self.work_dir, "zombies")
@@ -16,7 +25,6 @@ class CoreWarsE2ETest(unittest.TestCase):
         os.makedirs(self.zombies_dir)
 
     def tearDown(self):
-        self.engine.close()
         try:
             shutil.rmtree(self.work_dir)
         except OSError: